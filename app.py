@@ -1,1181 +1,1567 @@
-import os
-import re
-import json
-import tempfile
-from copy import deepcopy
-from string import Template
-from pathlib import Path
-import streamlit as st
-import pymupdf4llm
-import docx
-from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML, CSS
-import google.generativeai as genai
-from pypdf import PdfWriter, PdfReader
-from docx2pdf import convert
-
-# --- Page Configuration ---
-st.set_page_config(
-    page_title="ML Resume Formatter",
-    page_icon="📄",
-    layout="wide"
-)
-
-# --- API Key Configuration ---
-def get_api_key():
-    """Get API key from secrets or user input."""
-    api_key = None
-    
-    # Try to get from Streamlit secrets first
-    try:
-        api_key = st.secrets["GOOGLE_API_KEY"]
-        if api_key and api_key != "your-api-key-here":
-            return api_key
-    except (KeyError, FileNotFoundError):
-        pass
-    
-    # Fallback to sidebar input
-    with st.sidebar:
-        st.subheader("⚙️ Configuration")
-        api_key = st.text_input(
-            "Enter your Google Gemini API Key:",
-            type="password",
-            help="Get your API key from https://makersuite.google.com/app/apikey"
-        )
-    
-    return api_key if api_key else None
-
-
-# --- Text Extraction Functions ---
-def extract_text_from_pdf(file_path):
-    """Extract text from PDF using pymupdf4llm for better structure preservation."""
-    try:
-        # Use pymupdf4llm for better structure extraction
-        text = pymupdf4llm.to_markdown(file_path)
-        return text
-    except Exception as e:
-        st.error(f"Error extracting text from PDF: {e}")
-        return None
-
-
-def extract_text_from_docx(file_path):
-    """Extract text from DOCX file."""
-    try:
-        doc = docx.Document(file_path)
-        text = ""
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-        return text
-    except Exception as e:
-        st.error(f"Error extracting text from DOCX: {e}")
-        return None
-
-
-def extract_text_from_resume(file_path):
-    """Main extraction function that routes to appropriate handler."""
-    if file_path.lower().endswith('.pdf'):
-        return extract_text_from_pdf(file_path)
-    elif file_path.lower().endswith('.docx'):
-        return extract_text_from_docx(file_path)
-    else:
-        st.error("Unsupported file format. Please upload PDF or DOCX.")
-        return None
-
-
-# --- Editing Helpers ---
-def blank_experience():
-    return {"title": "", "company": "", "dates": "", "description": []}
-
-
-def blank_education():
-    return {"degree": "", "institution": "", "dates": "", "details": []}
-
-
-def blank_structured_entry():
-    return {"title": "", "organization": "", "dates": "", "description": []}
-
-
-def sanitize_multiline(text):
-    if not text:
-        return []
-    if isinstance(text, list):
-        return [line.strip() for line in text if isinstance(line, str) and line.strip()]
-    return [line.strip() for line in str(text).splitlines() if line.strip()]
-
-
-def safe_strip(value):
-    if value is None:
-        return ""
-    if isinstance(value, str):
-        return value.strip()
-    return str(value).strip()
-
-
-def reset_editor_widget_state():
-    keys_to_clear = [key for key in st.session_state.keys() if any(
-        key.startswith(prefix) for prefix in (
-            "editor_", "exp_", "edu_", "section_"
-        )
-    )]
-    for key in keys_to_clear:
-        del st.session_state[key]
-
-
-def clear_resume_processing_state():
-    resume_keys = [
-        "parsed_resume",
-        "edited_resume",
-        "parse_warnings",
-        "generated_pdf",
-        "edited_json",
-        "validation_errors",
-        "validation_warnings",
-        "uploaded_filename",
-        "candidate_sheet",
-        "candidate_sheet_signature",
-    ]
-    for key in resume_keys:
-        st.session_state.pop(key, None)
-    reset_editor_widget_state()
-
-
-def validate_resume_data(data):
-    errors = []
-    warnings = []
-
-    if not isinstance(data, dict):
-        errors.append("Parsed resume data is not in the expected format.")
-        return errors, warnings
-
-    # ===== NAME VALIDATION =====
-    name = safe_strip(data.get("name", ""))
-    if not name:
-        errors.append("Candidate name is empty.")
-    elif len(name) < 3:
-        warnings.append("Name seems too short - is it complete?")
-    elif name.isupper() and len(name) > 10:
-        warnings.append("Name is in all caps - consider using proper case.")
-
-    # ===== EXPERIENCE VALIDATION =====
-    experience = data.get("experience", [])
-    if not experience:
-        errors.append("No experience entries provided.")
-    else:
-        for idx, entry in enumerate(experience, start=1):
-            entry_data = entry or {}
-            title = safe_strip(entry_data.get("title", ""))
-            company = safe_strip(entry_data.get("company", ""))
-            dates = safe_strip(entry_data.get("dates", ""))
-            description = sanitize_multiline(entry_data.get("description", []))
-            
-            # Missing critical fields
-            if not title and not company:
-                errors.append(f"Experience #{idx} is missing both title and company.")
-            if not title:
-                warnings.append(f"Experience #{idx} is missing job title.")
-            if not company:
-                warnings.append(f"Experience #{idx} is missing company name.")
-            if not dates:
-                warnings.append(f"Experience #{idx} is missing dates.")
-            
-            # Description validation
-            if not description:
-                warnings.append(f"Experience #{idx} has no bullet points.")
-            else:
-                # Check for empty or very short bullets
-                for bullet_idx, bullet in enumerate(description, start=1):
-                    if len(bullet.strip()) < 10:
-                        warnings.append(f"Experience #{idx}, bullet {bullet_idx} is too short (less than 10 characters).")
-                    if has_problematic_characters(bullet):
-                        warnings.append(f"Experience #{idx}, bullet {bullet_idx} contains special characters that may not render properly.")
-        
-        # Check for duplicate experiences
-        if len(experience) > 1:
-            for i in range(len(experience)):
-                for j in range(i + 1, len(experience)):
-                    if is_duplicate_entry(experience[i], experience[j]):
-                        warnings.append(f"Experience #{i+1} and #{j+1} appear to be duplicates.")
-
-    # ===== EDUCATION VALIDATION =====
-    education = data.get("education", [])
-    if not education:
-        warnings.append("No education entries provided - consider adding your educational background.")
-    else:
-        for idx, entry in enumerate(education, start=1):
-            entry_data = entry or {}
-            degree = safe_strip(entry_data.get("degree", ""))
-            institution = safe_strip(entry_data.get("institution", ""))
-            dates = safe_strip(entry_data.get("dates", ""))
-            
-            if not any([degree, institution, dates]):
-                errors.append(f"Education entry #{idx} is completely empty.")
-            else:
-                if not degree:
-                    warnings.append(f"Education #{idx} is missing degree/credential.")
-                if not institution:
-                    warnings.append(f"Education #{idx} is missing institution name.")
-                if not dates:
-                    warnings.append(f"Education #{idx} is missing dates.")
-
-    # ===== OTHER SECTIONS VALIDATION =====
-    other_sections = data.get("other_sections", [])
-    for sec_idx, section in enumerate(other_sections, start=1):
-        section_title = safe_strip(section.get("section_title", ""))
-        section_type = section.get("type", "")
-        
-        if not section_title:
-            warnings.append(f"Additional section #{sec_idx} has no title.")
-        
-        if section_type == "structured":
-            entries = section.get("entries", [])
-            if not entries:
-                warnings.append(f"Section '{section_title}' has no entries.")
-            for entry_idx, entry in enumerate(entries, start=1):
-                if not any([safe_strip(entry.get("title", "")), 
-                           safe_strip(entry.get("organization", "")),
-                           entry.get("description", [])]):
-                    warnings.append(f"Section '{section_title}', entry #{entry_idx} is empty.")
-        
-        elif section_type == "list":
-            items = section.get("items", [])
-            if not items:
-                warnings.append(f"Section '{section_title}' has no items.")
-            for item_idx, item in enumerate(items, start=1):
-                if len(safe_strip(item)) < 3:
-                    warnings.append(f"Section '{section_title}', item #{item_idx} is too short.")
-
-    return errors, warnings
-
-
-def has_problematic_characters(text):
-    """Check for characters that might not render well in PDF."""
-    # Check for corrupted encoding artifacts
-    problematic_patterns = [
-        r'â€',  # Common corruption pattern
-        r'[\x00-\x08\x0B\x0C\x0E-\x1F]',  # Control characters
-        r'�',  # Replacement character (indicates encoding issues)
-    ]
-    
-    for pattern in problematic_patterns:
-        if re.search(pattern, text):
-            return True
-    return False
-
-
-def is_duplicate_entry(entry1, entry2):
-    """Check if two experience/education entries are duplicates."""
-    # Compare key fields
-    def get_signature(entry):
-        return (
-            safe_strip(entry.get("title", "")).lower(),
-            safe_strip(entry.get("company", "")).lower(),
-            safe_strip(entry.get("degree", "")).lower(),
-            safe_strip(entry.get("institution", "")).lower(),
-        )
-    
-    sig1 = get_signature(entry1)
-    sig2 = get_signature(entry2)
-    
-    # If at least 2 fields match exactly, likely duplicate
-    matches = sum(1 for a, b in zip(sig1, sig2) if a and b and a == b)
-    return matches >= 2
-
-
-# --- LLM Parser ---
-def parse_resume_with_gemini(text, api_key):
-    """Parse resume text using Gemini LLM to extract structured data without summarizing."""
-    
-    # Configure Gemini
-    genai.configure(api_key=api_key)
-    
-    # Clean encoding issues BEFORE sending to LLM
-    def clean_encoding(text):
-        if isinstance(text, str):
-            text = text.replace('–', '-')  # en-dash
-            text = text.replace('—', '-')  # em-dash
-            text = text.replace('"', '"').replace('"', '"')  # smart quotes
-            text = text.replace(''', "'").replace(''', "'")  # smart apostrophes
-            text = text.replace('…', '...')  # ellipsis
-            text = text.replace('â€"', '-')  # corrupted en-dash
-            text = text.replace('â€œ', '"').replace('â€', '"')  # corrupted quotes
-            text = text.replace('â€™', "'").replace('â€˜', "'")  # corrupted apostrophes
-            text = text.replace('â€¢', '•')  # corrupted bullet
-            text = text.replace('â€¦', '...')  # corrupted ellipsis
-            # Normalize subscripts/superscripts (not supported by xhtml2pdf)
-            subscripts = str.maketrans('₀₁₂₃₄₅₆₇₈₉', '0123456789')
-            superscripts = str.maketrans('⁰¹²³⁴⁵⁶⁷⁸⁹', '0123456789')
-            text = text.translate(subscripts).translate(superscripts)
-        return text
-    
-    text = clean_encoding(text)
-    
-    # Create the extraction prompt - emphasis on PRESERVING exact content
-    prompt_template = Template("""
-You are an expert resume parser. Produce a single JSON object that mirrors the resume content without inventing information.
-
-PRIMARY GOALS
-1. Preserve wording exactly; do not summarize, paraphrase, or translate.
-2. Normalize formatting only—remove pipes, duplicate spaces, leading bullets, and line breaks that split sentences.
-3. Capture every section that delivers meaningful content.
-
-OUTPUT RULES
-- Return JSON only. No markdown fences, comments, or natural-language chatter.
-- Use UTF-8 characters; replace corrupted symbols (â€“, â€™, etc.) with intended ASCII equivalents.
-- If a value is unknown, omit the field; never return null.
-
-SCHEMA
-{
-  "name": "<full name from resume header>",
-  "email": "<primary email if present>",
-  "phone": "<primary phone number if present>",
-  "location": "<primary location or city if present>",
-  "linkedin": "<primary LinkedIn URL if present>",
-  "website": "<primary website or portfolio if present>",
-  "github": "<GitHub URL if present>",
-  "experience": [
-    {
-      "title": "<exact job title>",
-      "company": "<company name with location if present>",
-      "dates": "<verbatim date range>",
-      "description": ["<bullet point 1>", "<bullet point 2>", …]
-    }
-  ],
-  "education": [
-    {
-      "degree": "<degree name>",
-      "institution": "<institution name with location if present>",
-      "dates": "<verbatim dates>",
-      "details": ["<detail 1>", …]
-    }
-  ],
-  "other_sections": [
-    {
-      "section_title": "<exact section heading>",
-      "type": "structured",
-      "entries": [
-        {
-          "title": "<role/project/activity>",
-          "organization": "<organization if given>",
-          "dates": "<verbatim dates>",
-          "description": ["<bullet>", …]
-        }
-      ]
-    },
-    {
-      "section_title": "<exact section heading>",
-      "type": "list",
-      "items": ["<item>", …]
-    }
-  ]
-}
-
-INSTRUCTIONS
-- Classify each section as `structured` if items contain titles/roles; otherwise use `list`.
-- Combine organization and location inside the same string separated by a comma.
-- Include every distinct contact detail line in `contact_details` in the order encountered near the top of the resume.
-- Populate dedicated contact fields (`email`, `phone`, `location`, `linkedin`, `website`, `github`) when available; leave them out if not found.
-- Merge multi-line bullets into single strings when they form one sentence or idea.
-- Preserve order of sections and entries as they appear.
-- Keep acronyms and capitalization exactly as given.
-- For overlapping roles at the same company, output separate entries.
-- If the resume lacks a recognized section, omit the array entirely.
-- If you detect parsing uncertainty (e.g., ambiguous tables, duplicate sections), include `"_warnings": ["<detailed note>"]`. Be specific about which entries or sections are problematic, referencing them by position (e.g., "First CAREER EXPERIENCE section at top vs. second at bottom") or by job title/company name. Otherwise output `"_warnings": []`.
-- Finish with `"version": "v2"` to signal the schema version.
-
-Resume text:
----
-$resume_text
----
-""")
-
-    prompt = prompt_template.substitute(resume_text=text)
-    
-    try:
-        with st.spinner("🧠 Parsing resume with Gemini AI..."):
-            model = genai.GenerativeModel('gemini-2.5-pro')
-            generation_config = genai.types.GenerationConfig(
-                temperature=0  # Deterministic output for consistency
-            )
-            response = model.generate_content(
-                prompt, 
-                generation_config=generation_config,
-                request_options={"timeout": 120}
-            )
-            
-            response_text = response.text.strip()
-            
-            # Remove markdown code fences if present
-            if response_text.startswith("```json"):
-                match = re.search(r'```json\n(.*?)\n```', response_text, re.DOTALL)
-                if match:
-                    response_text = match.group(1)
-            elif response_text.startswith("```"):
-                match = re.search(r'```\n(.*?)\n```', response_text, re.DOTALL)
-                if match:
-                    response_text = match.group(1)
-            
-            # Parse JSON
-            parsed_data = json.loads(response_text)
-            
-            # Simple cleanup of any remaining artifacts
-            def clean_text(text):
-                if isinstance(text, str):
-                    text = text.strip()
-                    # Remove any remaining leading dashes/bullets
-                    text = text.lstrip('- •·∙→▪')
-                    text = text.strip()
-                return text
-            
-            def clean_dict(obj):
-                if isinstance(obj, dict):
-                    return {k: clean_dict(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [clean_dict(item) for item in obj]
-                elif isinstance(obj, str):
-                    return clean_text(obj)
-                return obj
-            
-            parsed_data = clean_dict(parsed_data)
-            
-            # Log the parsed data for debugging
-            with st.expander("🔍 View Extracted Data (Debug)", expanded=False):
-                st.json(parsed_data)
-            
-            return parsed_data
-            
-    except json.JSONDecodeError as e:
-        st.error(f"❌ Failed to parse JSON response from Gemini")
-        with st.expander("📋 Error Details", expanded=True):
-            st.error(f"JSON Error: {e}")
-            st.code(response_text, language="text")
-        return None
-        
-    except Exception as e:
-        st.error(f"❌ Error calling Gemini API: {e}")
-        with st.expander("📋 Error Details", expanded=True):
-            st.exception(e)
-        return None
-
-
-# --- PDF Generation ---
-def generate_pdf(data, output_path):
-    """Generate formatted PDF from parsed data using HTML template."""
-    try:
-        with st.spinner("📄 Generating formatted PDF..."):
-            # Get the directory where this script is located
-            template_dir = os.path.dirname(os.path.abspath(__file__))
-            
-            # Load template
-            env = Environment(loader=FileSystemLoader(template_dir), autoescape=True)
-            template = env.get_template("templatev2.html")
-            
-            # Render HTML with absolute logo path
-            logo_file = Path(template_dir, 'ml-logo (1).png')
-            logo_uri = logo_file.resolve().as_uri() if logo_file.exists() else ''
-            data_with_logo = {**data, 'logo_path': logo_uri}
-            html_content = template.render(data_with_logo)
-            
-            # Generate PDF using WeasyPrint (better CSS support)
-            html = HTML(string=html_content, base_url=template_dir)
-            html.write_pdf(target=output_path)
-            
-            return True
-            
-    except Exception as e:
-        st.error(f"❌ Error generating PDF: {e}")
-        with st.expander("📋 Error Details", expanded=True):
-            st.exception(e)
-        return False
-
-
-def convert_docx_to_pdf(docx_path, pdf_path):
-    """Convert DOCX file to PDF using docx2pdf."""
-    try:
-        convert(docx_path, pdf_path)
-        return True
-    except Exception as e:
-        st.error(f"❌ Error converting DOCX to PDF: {e}")
-        with st.expander("📋 Error Details", expanded=True):
-            st.exception(e)
-        return False
-
-
-def merge_pdfs(main_pdf_path, candidate_sheet_path, output_path):
-    """Merge two PDFs - append candidate sheet to the end of main resume."""
-    try:
-        pdf_writer = PdfWriter()
-        
-        # Add all pages from main resume
-        with open(main_pdf_path, 'rb') as main_file:
-            main_pdf = PdfReader(main_file)
-            for page in main_pdf.pages:
-                pdf_writer.add_page(page)
-        
-        # Add all pages from candidate sheet
-        with open(candidate_sheet_path, 'rb') as candidate_file:
-            candidate_pdf = PdfReader(candidate_file)
-            for page in candidate_pdf.pages:
-                pdf_writer.add_page(page)
-        
-        # Write merged PDF
-        with open(output_path, 'wb') as output_file:
-            pdf_writer.write(output_file)
-        
-        return True
-    except Exception as e:
-        st.error(f"❌ Error merging PDFs: {e}")
-        with st.expander("📋 Error Details", expanded=True):
-            st.exception(e)
-        return False
-
-
-# --- Main Application ---
-def main():
-    st.title("📄 Resume Formatter")
-    st.markdown("""
-    Transform your resume into a standardised, professional format.
-    
-    **How it works:**
-    1. Upload your resume (PDF or DOCX)
-    2. AI extracts and preserves your content
-    3. Download your beautifully formatted resume
-    """)
-    
-    st.session_state.setdefault("parsed_resume", None)
-    st.session_state.setdefault("edited_resume", None)
-    st.session_state.setdefault("parse_warnings", [])
-    st.session_state.setdefault("generated_pdf", None)
-    st.session_state.setdefault("edited_json", None)
-    st.session_state.setdefault("validation_errors", [])
-    st.session_state.setdefault("validation_warnings", [])
-    st.session_state.setdefault("uploaded_file_signature", None)
-    st.session_state.setdefault("candidate_sheet", None)
-    st.session_state.setdefault("candidate_sheet_signature", None)
-
-    # Get API key
-    api_key = get_api_key()
-    
-    if not api_key:
-        st.warning("⚠️ Please enter your Google Gemini API key to continue.")
-        st.info("Get your API key from: https://makersuite.google.com/app/apikey")
-        st.stop()
-    
-    # File uploaders
-    st.divider()
-    uploaded_file = st.file_uploader(
-        "Upload your resume",
-        type=['pdf', 'docx'],
-        help="Supported formats: PDF, DOCX"
-    )
-    
-    candidate_sheet_file = st.file_uploader(
-        "Upload Candidate Sheet (optional)",
-        type=['pdf', 'docx'],
-        help="Optional: Add an additional document to append after your resume"
-    )
-
-    if uploaded_file is not None:
-        file_signature = f"{uploaded_file.name}:{getattr(uploaded_file, 'size', None)}"
-        previous_signature = st.session_state.get("uploaded_file_signature")
-        if file_signature != previous_signature:
-            clear_resume_processing_state()
-            st.session_state["uploaded_file_signature"] = file_signature
-    else:
-        if st.session_state.get("uploaded_file_signature") is not None:
-            clear_resume_processing_state()
-            st.session_state["uploaded_file_signature"] = None
-    
-    # Handle candidate sheet file state
-    if candidate_sheet_file is not None:
-        candidate_signature = f"{candidate_sheet_file.name}:{getattr(candidate_sheet_file, 'size', None)}"
-        previous_candidate_signature = st.session_state.get("candidate_sheet_signature")
-        if candidate_signature != previous_candidate_signature:
-            st.session_state["candidate_sheet"] = candidate_sheet_file
-            st.session_state["candidate_sheet_signature"] = candidate_signature
-            # Clear generated PDF so user needs to regenerate with new candidate sheet
-            st.session_state["generated_pdf"] = None
-    else:
-        if st.session_state.get("candidate_sheet_signature") is not None:
-            st.session_state["candidate_sheet"] = None
-            st.session_state["candidate_sheet_signature"] = None
-            st.session_state["generated_pdf"] = None
-    
-    if uploaded_file is not None:
-        # Display file info
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.success(f"✅ File uploaded: {uploaded_file.name}")
-            if candidate_sheet_file is not None:
-                st.info(f"📎 Candidate sheet: {candidate_sheet_file.name}")
-        with col2:
-            process_button = st.button("🚀 Process Resume", type="primary", use_container_width=True)
-        
-        if process_button:
-            # Create temporary file to save upload
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_path = tmp_file.name
-            
-            try:
-                # Step 1: Extract text
-                with st.status("Processing resume...", expanded=True) as status:
-                    st.write("📄 Extracting text from resume...")
-                    raw_text = extract_text_from_resume(tmp_path)
-                    
-                    if not raw_text:
-                        st.error("Failed to extract text from resume.")
-                        status.update(label="❌ Processing failed", state="error")
-                        return
-                    
-                    st.write("✅ Text extracted successfully")
-                    
-                    # Show extracted raw text for debugging
-                    with st.expander("📝 View Extracted Text (What the LLM sees)", expanded=False):
-                        st.text_area("Raw Text from PDF/DOCX:", raw_text, height=300)
-                    
-                    # Step 2: Parse with Gemini
-                    st.write("🧠 Parsing resume structure...")
-                    parsed_data = parse_resume_with_gemini(raw_text, api_key)
-                    
-                    if not parsed_data:
-                        st.error("Failed to parse resume data.")
-                        status.update(label="❌ Processing failed", state="error")
-                        return
-                    
-                    st.write("✅ Resume parsed successfully")
-                    parsed_snapshot = deepcopy(parsed_data) if isinstance(parsed_data, dict) else parsed_data
-                    model_warnings = []
-                    if isinstance(parsed_snapshot, dict):
-                        model_warnings = parsed_snapshot.pop("_warnings", [])
-                    st.session_state["parse_warnings"] = model_warnings
-                    reset_editor_widget_state()
-                    if isinstance(parsed_snapshot, dict):
-                        st.session_state["parsed_resume"] = deepcopy(parsed_snapshot)
-                        st.session_state["edited_resume"] = deepcopy(parsed_snapshot)
-                        st.session_state["edited_json"] = json.dumps(parsed_snapshot, indent=2, ensure_ascii=False)
-                        errors, warnings = validate_resume_data(parsed_snapshot)
-                        st.session_state["validation_errors"] = errors
-                        st.session_state["validation_warnings"] = warnings
-                    else:
-                        st.session_state["parsed_resume"] = parsed_snapshot
-                        st.session_state["edited_resume"] = parsed_snapshot
-                        st.session_state["edited_json"] = json.dumps(parsed_data, indent=2, ensure_ascii=False)
-                        st.session_state["validation_errors"] = []
-                        st.session_state["validation_warnings"] = []
-                    st.session_state["generated_pdf"] = None
-                    st.session_state["uploaded_filename"] = uploaded_file.name
-                    st.success("Review the parsed data below before generating the PDF.")
-                    status.update(label="✅ Parsing complete — review the details below", state="complete")
-                
-            finally:
-                # Cleanup temporary input file
-                try:
-                    os.unlink(tmp_path)
-                except:
-                    pass
-    
-    edited_resume_data = st.session_state.get("edited_resume")
-
-    if edited_resume_data is not None:
-        st.divider()
-        st.subheader("Step 3: Review & edit details")
-
-        if not isinstance(edited_resume_data, dict):
-            st.warning("Parsed data is not in the expected object format. Please inspect the raw output in the debug panel.")
-        else:
-            warnings = st.session_state.get("parse_warnings", [])
-            if warnings:
-                st.warning("Gemini flagged the following items for review:")
-                for warning in warnings:
-                    st.markdown(f"- {warning}")
-
-            st.caption("Adjust any fields below. Leave an entry blank to remove it when you save.")
-
-            add_cols = st.columns(2)
-            with add_cols[0]:
-                if st.button("➕ Add experience entry"):
-                    current = deepcopy(edited_resume_data)
-                    current.setdefault("experience", []).append(blank_experience())
-                    st.session_state["edited_resume"] = current
-                    st.rerun()
-            with add_cols[1]:
-                if st.button("➕ Add education entry"):
-                    current = deepcopy(edited_resume_data)
-                    current.setdefault("education", []).append(blank_education())
-                    st.session_state["edited_resume"] = current
-                    st.rerun()
-
-            name_value = st.text_input(
-                "Candidate name",
-                value=edited_resume_data.get("name", ""),
-                key="editor_name"
-            )
-
-            version_value = st.text_input(
-                "Schema version",
-                value=edited_resume_data.get("version", ""),
-                key="editor_version"
-            )
-
-            contact_cols = st.columns(2)
-            with contact_cols[0]:
-                email_value = st.text_input(
-                    "Email",
-                    value=edited_resume_data.get("email", ""),
-                    key="contact_email"
-                )
-                phone_value = st.text_input(
-                    "Phone",
-                    value=edited_resume_data.get("phone", ""),
-                    key="contact_phone"
-                )
-            mobile_value = st.text_input(
-                "Alternate phone",
-                value=edited_resume_data.get("mobile", ""),
-                key="contact_mobile"
-            )
-            with contact_cols[1]:
-                location_value = st.text_input(
-                    "Location",
-                    value=edited_resume_data.get("location", ""),
-                    key="contact_location"
-                )
-                linkedin_value = st.text_input(
-                    "LinkedIn URL",
-                    value=edited_resume_data.get("linkedin", ""),
-                    key="contact_linkedin"
-                )
-                website_value = st.text_input(
-                    "Website / Portfolio",
-                    value=edited_resume_data.get("website", ""),
-                    key="contact_website"
-                )
-
-            github_value = st.text_input(
-                "GitHub",
-                value=edited_resume_data.get("github", ""),
-                key="contact_github"
-            )
-
-            contact_details_value = st.text_area(
-                "Additional Information (one per line)",
-                value="\n".join(edited_resume_data.get("contact_details", []) or []),
-                key="contact_details",
-                height=80,
-                help="Add custom contact details or other information to appear in the header (e.g., nationality, citizenship, portfolio links)"
-            )
-
-            experience_inputs = []
-            for idx, job in enumerate(edited_resume_data.get("experience", []) or []):
-                label = job.get("title") or job.get("company") or f"Experience #{idx + 1}"
-                with st.expander(f"Experience #{idx + 1}: {label}", expanded=False):
-                    title_value = st.text_input(
-                        "Title",
-                        value=job.get("title", ""),
-                        key=f"exp_title_{idx}"
-                    )
-                    company_value = st.text_input(
-                        "Company",
-                        value=job.get("company", ""),
-                        key=f"exp_company_{idx}"
-                    )
-                    dates_value = st.text_input(
-                        "Dates",
-                        value=job.get("dates", ""),
-                        key=f"exp_dates_{idx}"
-                    )
-                    description_value = st.text_area(
-                        "Description (one bullet per line)",
-                        value="\n".join(job.get("description", []) or []),
-                        key=f"exp_description_{idx}",
-                        height=140
-                    )
-                    remove_value = st.checkbox(
-                        "Remove this experience",
-                        value=False,
-                        key=f"exp_remove_{idx}"
-                    )
-                    experience_inputs.append({
-                        "title": title_value,
-                        "company": company_value,
-                        "dates": dates_value,
-                        "description_text": description_value,
-                        "remove": remove_value,
-                    })
-
-            education_inputs = []
-            for idx, edu in enumerate(edited_resume_data.get("education", []) or []):
-                label = edu.get("degree") or edu.get("institution") or f"Education #{idx + 1}"
-                with st.expander(f"Education #{idx + 1}: {label}", expanded=False):
-                    degree_value = st.text_input(
-                        "Degree",
-                        value=edu.get("degree", ""),
-                        key=f"edu_degree_{idx}"
-                    )
-                    institution_value = st.text_input(
-                        "Institution",
-                        value=edu.get("institution", ""),
-                        key=f"edu_institution_{idx}"
-                    )
-                    edu_dates_value = st.text_input(
-                        "Dates",
-                        value=edu.get("dates", ""),
-                        key=f"edu_dates_{idx}"
-                    )
-                    details_value = st.text_area(
-                        "Details (one per line)",
-                        value="\n".join(edu.get("details", []) or []),
-                        key=f"edu_details_{idx}",
-                        height=120
-                    )
-                    remove_education = st.checkbox(
-                        "Remove this education entry",
-                        value=False,
-                        key=f"edu_remove_{idx}"
-                    )
-                    education_inputs.append({
-                        "degree": degree_value,
-                        "institution": institution_value,
-                        "dates": edu_dates_value,
-                        "details_text": details_value,
-                        "remove": remove_education,
-                    })
-
-            other_sections_inputs = []
-            for sec_idx, section in enumerate(edited_resume_data.get("other_sections", []) or []):
-                section_title = section.get("section_title", "")
-                with st.expander(f"Additional Section #{sec_idx + 1}: {section_title or 'Untitled'}", expanded=False):
-                    section_title_value = st.text_input(
-                        "Section title",
-                        value=section_title,
-                        key=f"section_title_{sec_idx}"
-                    )
-                    section_type_value = st.selectbox(
-                        "Section type",
-                        options=["structured", "list"],
-                        index=0 if section.get("type", "structured") == "structured" else 1,
-                        key=f"section_type_{sec_idx}"
-                    )
-                    remove_section = st.checkbox(
-                        "Remove this section",
-                        value=False,
-                        key=f"section_remove_{sec_idx}"
-                    )
-
-                    entries_input = []
-                    items_input = ""
-                    if section_type_value == "structured":
-                        if st.button("➕ Add entry", key=f"add_structured_entry_{sec_idx}"):
-                            current = deepcopy(edited_resume_data)
-                            current.setdefault("other_sections", [])
-                            if sec_idx < len(current["other_sections"]):
-                                current["other_sections"][sec_idx].setdefault("entries", []).append(blank_structured_entry())
-                                st.session_state["edited_resume"] = current
-                                st.rerun()
-                        for entry_idx, entry in enumerate(section.get("entries", []) or []):
-                            st.markdown(f"**Entry {entry_idx + 1}**")
-                            entry_title_value = st.text_input(
-                                "Title",
-                                value=entry.get("title", ""),
-                                key=f"section_{sec_idx}_entry_title_{entry_idx}"
-                            )
-                            entry_org_value = st.text_input(
-                                "Organization",
-                                value=entry.get("organization", ""),
-                                key=f"section_{sec_idx}_entry_org_{entry_idx}"
-                            )
-                            entry_dates_value = st.text_input(
-                                "Dates",
-                                value=entry.get("dates", ""),
-                                key=f"section_{sec_idx}_entry_dates_{entry_idx}"
-                            )
-                            entry_desc_value = st.text_area(
-                                "Description (one per line)",
-                                value="\n".join(entry.get("description", []) or []),
-                                key=f"section_{sec_idx}_entry_desc_{entry_idx}",
-                                height=120
-                            )
-                            entry_remove = st.checkbox(
-                                "Remove this entry",
-                                value=False,
-                                key=f"section_{sec_idx}_entry_remove_{entry_idx}"
-                            )
-                            entries_input.append({
-                                "title": entry_title_value,
-                                "organization": entry_org_value,
-                                "dates": entry_dates_value,
-                                "description_text": entry_desc_value,
-                                "remove": entry_remove,
-                            })
-                    else:
-                        items_input = st.text_area(
-                            "Items (one per line)",
-                            value="\n".join(section.get("items", []) or []),
-                            key=f"section_{sec_idx}_items",
-                            height=120
-                        )
-
-                    other_sections_inputs.append({
-                        "section_title": section_title_value,
-                        "section_type": section_type_value,
-                        "remove": remove_section,
-                        "entries_input": entries_input,
-                        "items_input": items_input,
-                    })
-
-            sanitized_experience = []
-            for entry in experience_inputs:
-                if entry.get("remove"):
-                    continue
-                cleaned_entry = {
-                    "title": entry.get("title", "").strip(),
-                    "company": entry.get("company", "").strip(),
-                    "dates": entry.get("dates", "").strip(),
-                    "description": sanitize_multiline(entry.get("description_text", "")),
-                }
-                if any([cleaned_entry["title"], cleaned_entry["company"], cleaned_entry["dates"], cleaned_entry["description"]]):
-                    sanitized_experience.append(cleaned_entry)
-
-            sanitized_education = []
-            for entry in education_inputs:
-                if entry.get("remove"):
-                    continue
-                cleaned_entry = {
-                    "degree": entry.get("degree", "").strip(),
-                    "institution": entry.get("institution", "").strip(),
-                    "dates": entry.get("dates", "").strip(),
-                    "details": sanitize_multiline(entry.get("details_text", ""))
-                }
-                if any([cleaned_entry["degree"], cleaned_entry["institution"], cleaned_entry["dates"], cleaned_entry["details"]]):
-                    sanitized_education.append(cleaned_entry)
-
-            sanitized_other_sections = []
-            for section_input in other_sections_inputs:
-                if section_input.get("remove"):
-                    continue
-                title_clean = section_input.get("section_title", "").strip()
-                if section_input.get("section_type") == "structured":
-                    entries_clean = []
-                    for entry in section_input.get("entries_input", []):
-                        if entry.get("remove"):
-                            continue
-                        cleaned_entry = {
-                            "title": entry.get("title", "").strip(),
-                            "organization": entry.get("organization", "").strip(),
-                            "dates": entry.get("dates", "").strip(),
-                            "description": sanitize_multiline(entry.get("description_text", ""))
-                        }
-                        if any([cleaned_entry["title"], cleaned_entry["organization"], cleaned_entry["dates"], cleaned_entry["description"]]):
-                            entries_clean.append(cleaned_entry)
-                    if title_clean or entries_clean:
-                        sanitized_other_sections.append({
-                            "section_title": title_clean or "Untitled Section",
-                            "type": "structured",
-                            "entries": entries_clean
-                        })
-                else:
-                    items_clean = sanitize_multiline(section_input.get("items_input", ""))
-                    if title_clean or items_clean:
-                        sanitized_other_sections.append({
-                            "section_title": title_clean or "Untitled Section",
-                            "type": "list",
-                            "items": items_clean
-                        })
-
-            contact_details_clean = sanitize_multiline(contact_details_value)
-            contact_fields_raw = {
-                "email": email_value.strip(),
-                "phone": phone_value.strip(),
-                "mobile": mobile_value.strip(),
-                "location": location_value.strip(),
-                "linkedin": linkedin_value.strip(),
-                "website": website_value.strip(),
-                "github": github_value.strip(),
-            }
-            contact_fields = {k: v for k, v in contact_fields_raw.items() if v}
-
-            preserved_fields = {}
-            excluded_keys = {
-                "name", "experience", "education", "other_sections", "version",
-                "email", "phone", "mobile", "location",
-                "linkedin", "website", "github",
-                "contact_details"
-            }
-            for key, value in edited_resume_data.items():
-                if key not in excluded_keys:
-                    preserved_fields[key] = deepcopy(value)
-
-            updated_resume = {**preserved_fields}
-            updated_resume["name"] = name_value.strip()
-            updated_resume["experience"] = sanitized_experience
-            updated_resume["education"] = sanitized_education
-            if sanitized_other_sections:
-                updated_resume["other_sections"] = sanitized_other_sections
-            else:
-                updated_resume["other_sections"] = []
-
-            for key, value in contact_fields.items():
-                updated_resume[key] = value
-
-            if contact_details_clean:
-                updated_resume["contact_details"] = contact_details_clean
-            else:
-                updated_resume.pop("contact_details", None)
-
-            version_clean = version_value.strip()
-            if version_clean:
-                updated_resume["version"] = version_clean
-            elif "version" in updated_resume:
-                updated_resume.pop("version")
-
-            validation_errors, validation_warnings = validate_resume_data(updated_resume)
-
-            if validation_errors:
-                st.error("Please address the following before generating:")
-                for issue in validation_errors:
-                    st.markdown(f"- {issue}")
-
-            if validation_warnings:
-                st.warning("You can continue, but review these items:")
-                for warning in validation_warnings:
-                    st.markdown(f"- {warning}")
-
-            if not validation_errors and not validation_warnings:
-                st.success("All required sections look good. You can generate the PDF when ready.")
-            elif not validation_errors and validation_warnings:
-                st.info("No blocking issues detected. The warnings above are optional but recommended to address.")
-
-            action_cols = st.columns(2)
-            with action_cols[0]:
-                if st.button("💾 Save edits", key="save_edits"):
-                    st.session_state["edited_resume"] = deepcopy(updated_resume)
-                    st.session_state["edited_json"] = json.dumps(updated_resume, indent=2, ensure_ascii=False)
-                    st.session_state["validation_errors"] = validation_errors
-                    st.session_state["validation_warnings"] = validation_warnings
-                    st.success("Edits saved to session.")
-            with action_cols[1]:
-                generate_disabled = bool(validation_errors)
-                if st.button("✅ Confirm & Generate PDF", type="primary", key="generate_pdf_button", disabled=generate_disabled):
-                    st.session_state["edited_resume"] = deepcopy(updated_resume)
-                    st.session_state["edited_json"] = json.dumps(updated_resume, indent=2, ensure_ascii=False)
-                    st.session_state["validation_errors"] = validation_errors
-                    st.session_state["validation_warnings"] = validation_warnings
-                    output_path = None
-                    candidate_temp_pdf = None
-                    candidate_temp_docx = None
-                    final_output_path = None
-                    try:
-                        # Generate main resume PDF
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_output:
-                            output_path = tmp_output.name
-                        
-                        if generate_pdf(updated_resume, output_path):
-                            # Check if there's a candidate sheet to append
-                            candidate_sheet = st.session_state.get("candidate_sheet")
-                            
-                            if candidate_sheet is not None:
-                                # Save candidate sheet to temporary file
-                                file_ext = os.path.splitext(candidate_sheet.name)[1].lower()
-                                
-                                if file_ext == '.docx':
-                                    # Save DOCX and convert to PDF
-                                    with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_docx:
-                                        tmp_docx.write(candidate_sheet.getvalue())
-                                        candidate_temp_docx = tmp_docx.name
-                                    
-                                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_pdf:
-                                        candidate_temp_pdf = tmp_pdf.name
-                                    
-                                    with st.spinner("Converting candidate sheet to PDF..."):
-                                        if not convert_docx_to_pdf(candidate_temp_docx, candidate_temp_pdf):
-                                            st.warning("Failed to convert candidate sheet. Proceeding with resume only.")
-                                            candidate_temp_pdf = None
-                                
-                                elif file_ext == '.pdf':
-                                    # Save PDF directly
-                                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_pdf:
-                                        tmp_pdf.write(candidate_sheet.getvalue())
-                                        candidate_temp_pdf = tmp_pdf.name
-                                
-                                # Merge PDFs if candidate sheet was successfully processed
-                                if candidate_temp_pdf:
-                                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_merged:
-                                        final_output_path = tmp_merged.name
-                                    
-                                    with st.spinner("Merging resume with candidate sheet..."):
-                                        if merge_pdfs(output_path, candidate_temp_pdf, final_output_path):
-                                            # Read merged PDF
-                                            with open(final_output_path, 'rb') as pdf_file:
-                                                pdf_data = pdf_file.read()
-                                        else:
-                                            st.warning("Failed to merge candidate sheet. Proceeding with resume only.")
-                                            with open(output_path, 'rb') as pdf_file:
-                                                pdf_data = pdf_file.read()
-                                else:
-                                    # No candidate sheet or conversion failed, use main resume only
-                                    with open(output_path, 'rb') as pdf_file:
-                                        pdf_data = pdf_file.read()
-                            else:
-                                # No candidate sheet, use main resume only
-                                with open(output_path, 'rb') as pdf_file:
-                                    pdf_data = pdf_file.read()
-                            
-                            name_for_filename = updated_resume.get('name', 'Resume')
-                            safe_name = "".join(c for c in name_for_filename if c.isalnum() or c in (' ', '_')).rstrip()
-                            if not safe_name:
-                                safe_name = 'Resume'
-                            pdf_filename = f"Formatted_{safe_name.replace(' ', '_')}.pdf"
-                            st.session_state["generated_pdf"] = {
-                                "data": pdf_data,
-                                "filename": pdf_filename,
-                            }
-                            st.success("PDF generated successfully. Download it below.")
-                        else:
-                            st.error("Failed to generate PDF. Please review the data and try again.")
-                    finally:
-                        # Cleanup temporary files
-                        for temp_file in [output_path, candidate_temp_pdf, candidate_temp_docx, final_output_path]:
-                            if temp_file and os.path.exists(temp_file):
-                                try:
-                                    os.unlink(temp_file)
-                                except OSError:
-                                    pass
-
-            generated_pdf = st.session_state.get("generated_pdf")
-            if generated_pdf:
-                st.divider()
-                st.success("🎉 Your formatted resume is ready!")
-                download_cols = st.columns(2)
-                with download_cols[0]:
-                    st.download_button(
-                        label="⬇️ Download Formatted Resume",
-                        data=generated_pdf.get("data"),
-                        file_name=generated_pdf.get("filename", "Formatted_Resume.pdf"),
-                        mime="application/pdf",
-                        use_container_width=True
-                    )
-                with download_cols[1]:
-                    edited_json = st.session_state.get("edited_json")
-                    if edited_json:
-                        json_filename = generated_pdf.get("filename", "Formatted_Resume.pdf").replace('.pdf', '.json')
-                        st.download_button(
-                            label="⬇️ Download Edited JSON",
-                            data=edited_json,
-                            file_name=json_filename,
-                            mime="application/json",
-                            use_container_width=True
-                        )
-
-    # Footer
-    st.divider()
-    st.markdown("""
-    <div style='text-align: center; color: #666; padding: 20px;'>
-        <small>Powered by Google Gemini AI | Built with Streamlit</small>
-    </div>
-    """, unsafe_allow_html=True)
-
-
-if __name__ == "__main__":
-    main()
-
-
+import os
+import re
+import sys
+import atexit
+import weakref
+import shutil
+import hashlib
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache, partial, wraps
+from itertools import combinations
+from string import Template
+from pathlib import Path
+from typing_extensions import TypedDict
+import streamlit as st
+import orjson
+import pymupdf
+import pymupdf4llm
+import docx
+from jinja2 import Environment, FileSystemLoader
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+import google.generativeai as genai
+from docx2pdf import convert
+
+# --- Page Configuration ---
+st.set_page_config(
+    page_title="ML Resume Formatter",
+    page_icon="📄",
+    layout="wide"
+)
+
+# --- API Key Configuration ---
+def get_api_key():
+    """Get API key from secrets or user input."""
+    api_key = None
+    
+    # Try to get from Streamlit secrets first
+    try:
+        api_key = st.secrets["GOOGLE_API_KEY"]
+        if api_key and api_key != "your-api-key-here":
+            return api_key
+    except (KeyError, FileNotFoundError):
+        pass
+    
+    # Fallback to sidebar input
+    with st.sidebar:
+        st.subheader("⚙️ Configuration")
+        api_key = st.text_input(
+            "Enter your Google Gemini API Key:",
+            type="password",
+            help="Get your API key from https://makersuite.google.com/app/apikey"
+        )
+    
+    return api_key if api_key else None
+
+
+# --- Upload Helpers ---
+# Scratch PDFs go to tmpfs where it exists (Linux), so generating and merging
+# never touches the disk
+PDF_TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def save_upload_to_tempfile(uploaded_file, suffix, dir=None):
+    """Stream an uploaded file to a named temporary file in dir and return its path."""
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=dir) as tmp_file:
+        # 1 MiB chunks: no full in-memory copy, few write syscalls
+        shutil.copyfileobj(uploaded_file, tmp_file, length=1024 * 1024)
+        return tmp_file.name
+
+
+# --- Text Extraction Functions ---
+def extract_text_from_pdf(file_path):
+    """Extract text from PDF using pymupdf4llm for better structure preservation."""
+    try:
+        # Use pymupdf4llm for better structure extraction
+        text = pymupdf4llm.to_markdown(file_path)
+        return text
+    except Exception as e:
+        st.error(f"Error extracting text from PDF: {e}")
+        return None
+
+
+def extract_text_from_docx(file_path):
+    """Extract text from DOCX file."""
+    try:
+        doc = docx.Document(file_path)
+        return "\n".join(para.text for para in doc.paragraphs)
+    except Exception as e:
+        st.error(f"Error extracting text from DOCX: {e}")
+        return None
+
+
+EXTRACTORS = {
+    '.pdf': extract_text_from_pdf,
+    '.docx': extract_text_from_docx,
+}
+
+
+def extract_text_from_resume(file_path):
+    """Main extraction function that routes to appropriate handler."""
+    extractor = EXTRACTORS.get(Path(file_path).suffix.lower())
+    if extractor is None:
+        st.error("Unsupported file format. Please upload PDF or DOCX.")
+        return None
+    return extractor(file_path)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def extract_text_cached(file_digest, suffix, _uploaded_file):
+    """Extract text once per unique upload.
+
+    Keyed on the upload's content digest and suffix; the file object itself
+    is not hashed (leading underscore).
+    """
+    tmp_path = save_upload_to_tempfile(_uploaded_file, suffix)
+    try:
+        return extract_text_from_resume(tmp_path)
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+# --- Editing Helpers ---
+def blank_experience():
+    return {"title": "", "company": "", "dates": "", "description": []}
+
+
+def blank_education():
+    return {"degree": "", "institution": "", "dates": "", "details": []}
+
+
+def blank_structured_entry():
+    return {"title": "", "organization": "", "dates": "", "description": []}
+
+
+def sanitize_multiline(text):
+    if not text:
+        return []
+    # Strip each line once and drop the empty ones; splitlines, strip and
+    # filter all run in C
+    if isinstance(text, list):
+        return list(filter(None, (line.strip() for line in text if isinstance(line, str))))
+    return list(filter(None, map(str.strip, str(text).splitlines())))
+
+
+def to_pretty_json(data):
+    """Serialize resume data as indented UTF-8 JSON text for download."""
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")
+
+
+def fast_clone(data):
+    """Deep-copy JSON-compatible data with an orjson round-trip (much faster than deepcopy)."""
+    return orjson.loads(orjson.dumps(data))
+
+
+def safe_strip(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value.strip()
+    return str(value).strip()
+
+
+def strip_fields(entry, keys):
+    """Return the stripped value of each key, computed once per entry."""
+    return {key: safe_strip(entry.get(key, "")) for key in keys}
+
+
+def is_clean_lines(value):
+    """True for a list of non-empty, stripped strings, as produced by the parser cleanup and the editor.
+
+    sanitize_multiline would return such a list unchanged.
+    """
+    return isinstance(value, list) and all(
+        isinstance(line, str) and line and line == line.strip() for line in value
+    )
+
+
+@dataclass(frozen=True)
+class ResumeView:
+    """The saved resume's editable lists, with missing or null values normalized to []."""
+    experience: list
+    education: list
+    other_sections: list
+    contact_details: list
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            experience=data.get("experience") or [],
+            education=data.get("education") or [],
+            other_sections=data.get("other_sections") or [],
+            contact_details=data.get("contact_details") or [],
+        )
+
+
+EDITOR_WIDGET_PREFIXES = ("editor_", "contact_", "exp_", "edu_", "section_")
+
+RESUME_STATE_KEYS = frozenset([
+    "parsed_resume",
+    "edited_resume",
+    "parse_warnings",
+    "generated_pdf",
+    "validation_errors",
+    "validation_warnings",
+    "uploaded_filename",
+    "candidate_sheet",
+    "candidate_sheet_signature",
+    "candidate_sheet_pdf",
+])
+
+
+def reset_editor_widget_state():
+    keys_to_clear = [key for key in st.session_state if key.startswith(EDITOR_WIDGET_PREFIXES)]
+    for key in keys_to_clear:
+        del st.session_state[key]
+
+
+def seed_multiline_widget(key, lines):
+    """Join a list into a text area's initial value the first time its key is rendered."""
+    if key not in st.session_state:
+        st.session_state[key] = "\n".join(lines or [])
+
+
+def clear_resume_processing_state():
+    for key in st.session_state.keys() & RESUME_STATE_KEYS:
+        del st.session_state[key]
+    reset_editor_widget_state()
+
+
+EXPERIENCE_TEXT_FIELDS = ("title", "company", "dates")
+EDUCATION_TEXT_FIELDS = ("degree", "institution", "dates")
+SECTION_ENTRY_TEXT_FIELDS = ("title", "organization", "dates")
+
+# Top-level keys rebuilt from the editor; everything else is carried over as-is
+EDITOR_MANAGED_KEYS = frozenset({
+    "name", "experience", "education", "other_sections", "version",
+    "email", "phone", "mobile", "location",
+    "linkedin", "website", "github",
+    "contact_details",
+})
+
+
+def _normalize_entry(raw, text_fields, multiline_fields):
+    """Strip one editor entry's text fields and split its multi-line fields in a single pass.
+
+    ``multiline_fields`` maps each output key to the raw widget key holding its text.
+    """
+    get = raw.get
+    entry = {key: (get(key) or "").strip() for key in text_fields}
+    for key, raw_key in multiline_fields.items():
+        entry[key] = sanitize_multiline(get(raw_key))
+    return entry
+
+
+def build_updated_resume(resume_data, raw_inputs):
+    """Sanitize the raw editor values and merge them over the saved resume data."""
+    sanitized_experience = []
+    for entry in raw_inputs["experience"]:
+        if entry.get("remove"):
+            continue
+        cleaned_entry = _normalize_entry(entry, EXPERIENCE_TEXT_FIELDS, {"description": "description_text"})
+        if cleaned_entry["title"] or cleaned_entry["company"] or cleaned_entry["dates"] or cleaned_entry["description"]:
+            sanitized_experience.append(cleaned_entry)
+
+    sanitized_education = []
+    for entry in raw_inputs["education"]:
+        if entry.get("remove"):
+            continue
+        cleaned_entry = _normalize_entry(entry, EDUCATION_TEXT_FIELDS, {"details": "details_text"})
+        if cleaned_entry["degree"] or cleaned_entry["institution"] or cleaned_entry["dates"] or cleaned_entry["details"]:
+            sanitized_education.append(cleaned_entry)
+
+    sanitized_other_sections = []
+    for section_input in raw_inputs["other_sections"]:
+        if section_input.get("remove"):
+            continue
+        title_clean = section_input.get("section_title", "").strip()
+        if section_input.get("section_type") == "structured":
+            entries_clean = []
+            for entry in section_input.get("entries_input", []):
+                if entry.get("remove"):
+                    continue
+                cleaned_entry = _normalize_entry(entry, SECTION_ENTRY_TEXT_FIELDS, {"description": "description_text"})
+                if cleaned_entry["title"] or cleaned_entry["organization"] or cleaned_entry["dates"] or cleaned_entry["description"]:
+                    entries_clean.append(cleaned_entry)
+            if title_clean or entries_clean:
+                sanitized_other_sections.append({
+                    "section_title": title_clean or "Untitled Section",
+                    "type": "structured",
+                    "entries": entries_clean
+                })
+        else:
+            items_clean = sanitize_multiline(section_input.get("items_input", ""))
+            if title_clean or items_clean:
+                sanitized_other_sections.append({
+                    "section_title": title_clean or "Untitled Section",
+                    "type": "list",
+                    "items": items_clean
+                })
+
+    contact_details_clean = sanitize_multiline(raw_inputs["contact_details"])
+    contact_fields_raw = {
+        "email": raw_inputs["email"].strip(),
+        "phone": raw_inputs["phone"].strip(),
+        "mobile": raw_inputs["mobile"].strip(),
+        "location": raw_inputs["location"].strip(),
+        "linkedin": raw_inputs["linkedin"].strip(),
+        "website": raw_inputs["website"].strip(),
+        "github": raw_inputs["github"].strip(),
+    }
+    contact_fields = {k: v for k, v in contact_fields_raw.items() if v}
+
+    # Preserved values are only read downstream, so they can be shared with
+    # the saved data instead of copied
+    preserved_fields = {key: value for key, value in resume_data.items() if key not in EDITOR_MANAGED_KEYS}
+
+    updated_resume = {**preserved_fields}
+    updated_resume["name"] = raw_inputs["name"].strip()
+    updated_resume["experience"] = sanitized_experience
+    updated_resume["education"] = sanitized_education
+    if sanitized_other_sections:
+        updated_resume["other_sections"] = sanitized_other_sections
+    else:
+        updated_resume["other_sections"] = []
+
+    for key, value in contact_fields.items():
+        updated_resume[key] = value
+
+    if contact_details_clean:
+        updated_resume["contact_details"] = contact_details_clean
+    else:
+        updated_resume.pop("contact_details", None)
+
+    version_clean = raw_inputs["version"].strip()
+    if version_clean:
+        updated_resume["version"] = version_clean
+    elif "version" in updated_resume:
+        updated_resume.pop("version")
+
+    return updated_resume
+
+
+def validate_resume_data(data):
+    errors = []
+    warnings = []
+
+    if not isinstance(data, dict):
+        errors.append("Parsed resume data is not in the expected format.")
+        return errors, warnings
+
+    # ===== NAME VALIDATION =====
+    name = safe_strip(data.get("name", ""))
+    if not name:
+        errors.append("Candidate name is empty.")
+    elif len(name) < 3:
+        warnings.append("Name seems too short - is it complete?")
+    elif name.isupper() and len(name) > 10:
+        warnings.append("Name is in all caps - consider using proper case.")
+
+    # ===== EXPERIENCE VALIDATION =====
+    experience = data.get("experience", [])
+    if not experience:
+        errors.append("No experience entries provided.")
+    else:
+        for idx, entry in enumerate(experience, start=1):
+            entry_data = entry or {}
+            fields = strip_fields(entry_data, ("title", "company", "dates"))
+            title, company, dates = fields["title"], fields["company"], fields["dates"]
+            description = entry_data.get("description", [])
+            if not is_clean_lines(description):
+                description = sanitize_multiline(description)
+            
+            # Missing critical fields
+            if not title and not company:
+                errors.append(f"Experience #{idx} is missing both title and company.")
+            if not title:
+                warnings.append(f"Experience #{idx} is missing job title.")
+            if not company:
+                warnings.append(f"Experience #{idx} is missing company name.")
+            if not dates:
+                warnings.append(f"Experience #{idx} is missing dates.")
+            
+            # Description validation
+            if not description:
+                warnings.append(f"Experience #{idx} has no bullet points.")
+            else:
+                # Check for empty or very short bullets
+                for bullet_idx, bullet in enumerate(description, start=1):
+                    if len(bullet) < 10:
+                        warnings.append(f"Experience #{idx}, bullet {bullet_idx} is too short (less than 10 characters).")
+                    if has_problematic_characters(bullet):
+                        warnings.append(f"Experience #{idx}, bullet {bullet_idx} contains special characters that may not render properly.")
+        
+        # Check for duplicate experiences
+        for i, j in find_duplicate_entries(experience):
+            warnings.append(f"Experience #{i+1} and #{j+1} appear to be duplicates.")
+
+    # ===== EDUCATION VALIDATION =====
+    education = data.get("education", [])
+    if not education:
+        warnings.append("No education entries provided - consider adding your educational background.")
+    else:
+        for idx, entry in enumerate(education, start=1):
+            entry_data = entry or {}
+            fields = strip_fields(entry_data, ("degree", "institution", "dates"))
+            degree, institution, dates = fields["degree"], fields["institution"], fields["dates"]
+            
+            if not any([degree, institution, dates]):
+                errors.append(f"Education entry #{idx} is completely empty.")
+            else:
+                if not degree:
+                    warnings.append(f"Education #{idx} is missing degree/credential.")
+                if not institution:
+                    warnings.append(f"Education #{idx} is missing institution name.")
+                if not dates:
+                    warnings.append(f"Education #{idx} is missing dates.")
+
+    # ===== OTHER SECTIONS VALIDATION =====
+    other_sections = data.get("other_sections", [])
+    for sec_idx, section in enumerate(other_sections, start=1):
+        section_title = safe_strip(section.get("section_title", ""))
+        section_type = section.get("type", "")
+        
+        if not section_title:
+            warnings.append(f"Additional section #{sec_idx} has no title.")
+        
+        if section_type == "structured":
+            entries = section.get("entries", [])
+            if not entries:
+                warnings.append(f"Section '{section_title}' has no entries.")
+            for entry_idx, entry in enumerate(entries, start=1):
+                if not any([safe_strip(entry.get("title", "")), 
+                           safe_strip(entry.get("organization", "")),
+                           entry.get("description", [])]):
+                    warnings.append(f"Section '{section_title}', entry #{entry_idx} is empty.")
+        
+        elif section_type == "list":
+            items = section.get("items", [])
+            if not items:
+                warnings.append(f"Section '{section_title}' has no items.")
+            for item_idx, item in enumerate(items, start=1):
+                if len(safe_strip(item)) < 3:
+                    warnings.append(f"Section '{section_title}', item #{item_idx} is too short.")
+
+    return errors, warnings
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def validate_resume_cached(resume_bytes):
+    """Validate resume data once per unique content.
+
+    Takes the resume serialized with sorted keys so identical data always
+    hashes to the same cache key.
+    """
+    return validate_resume_data(orjson.loads(resume_bytes))
+
+
+# Characters that might not render well in PDF: corrupted encoding artifacts,
+# control characters and the replacement character (indicates encoding issues)
+_PROBLEMATIC_RE = re.compile(r'â€|[\x00-\x08\x0B\x0C\x0E-\x1F]|\ufffd')
+
+
+def has_problematic_characters(text):
+    """Check for characters that might not render well in PDF."""
+    return _PROBLEMATIC_RE.search(text) is not None
+
+
+SIGNATURE_FIELDS = ("title", "company", "degree", "institution")
+
+
+@lru_cache(maxsize=256)
+def normalize_signature(values):
+    """Stripped, lower-cased form of a tuple of raw signature values."""
+    return tuple(safe_strip(value).lower() for value in values)
+
+
+def entry_signature(entry):
+    """Normalized key fields used to compare experience/education entries."""
+    values = tuple(entry.get(field, "") for field in SIGNATURE_FIELDS)
+    try:
+        return normalize_signature(values)
+    except TypeError:
+        # Unhashable field value (e.g. a list); normalize without the cache
+        return normalize_signature.__wrapped__(values)
+
+
+def find_duplicate_entries(entries):
+    """Return sorted (i, j) index pairs of entries that are duplicates.
+
+    Two entries are duplicates when at least two of their signature fields are
+    non-empty and equal. Entries are bucketed by every pair of non-empty
+    signature fields instead of comparing all pairs of entries.
+    """
+    buckets = defaultdict(list)
+    for idx, entry in enumerate(entries):
+        signature = entry_signature(entry or {})
+        for a, b in combinations(range(len(signature)), 2):
+            if signature[a] and signature[b]:
+                buckets[(a, b, signature[a], signature[b])].append(idx)
+
+    pairs = set()
+    for indices in buckets.values():
+        pairs.update(combinations(indices, 2))
+    return sorted(pairs)
+
+
+# --- LLM Parser ---
+GEMINI_MODEL = 'gemini-2.5-pro'
+# Bump whenever the prompt or generation settings change so cached parses are invalidated
+PROMPT_VERSION = "4"
+PARSE_CACHE_DIR = Path.home() / ".cache" / "ml-resume-formatter"
+
+# Static extraction instructions - emphasis on PRESERVING exact content.
+# Sent as the model's system instruction so every call shares the same prefix.
+SYSTEM_PROMPT = """You are an expert resume parser. Return one JSON object that mirrors the resume content without inventing information.
+
+RULES
+- Preserve wording exactly; never summarize, paraphrase or translate. Keep acronyms and capitalization as given.
+- Normalize formatting only: remove pipes, duplicate spaces, leading bullets and line breaks that split sentences; merge multi-line bullets that form one sentence or idea.
+- Use UTF-8; replace corrupted symbols (â€“, â€™, etc.) with the intended ASCII.
+- Omit unknown fields and missing sections; never return null.
+- Take the name from the resume header. Copy dates verbatim.
+- Capture every section with meaningful content, in the order it appears. Output overlapping roles at the same company as separate entries.
+- Classify an additional section as `structured` (with `entries`) if its items have titles/roles, otherwise as `list` (with `items`).
+- Combine organization and location in one string separated by a comma.
+- Put every distinct contact detail line near the top of the resume in `contact_details`, in order, and also fill the dedicated contact fields when available.
+- List parsing uncertainties (ambiguous tables, duplicate sections) in `parse_warnings`, naming the entries or sections by position (e.g., "First CAREER EXPERIENCE section at top vs. second at bottom") or by job title/company; otherwise output `"parse_warnings": []`.
+- Set `"version": "v2"`.
+"""
+
+# Only the resume text changes between calls; the instructions go in SYSTEM_PROMPT
+PROMPT_TEMPLATE = Template("""Resume text:
+---
+$resume_text
+---
+""")
+
+
+# Response schema for Gemini's JSON mode. Every field is optional, matching
+# the "omit unknown fields" rule; the shape mirrors templatev2.html.
+class ExperienceEntry(TypedDict, total=False):
+    title: str
+    company: str
+    dates: str
+    description: list[str]
+
+
+class EducationEntry(TypedDict, total=False):
+    degree: str
+    institution: str
+    dates: str
+    details: list[str]
+
+
+class SectionEntry(TypedDict, total=False):
+    title: str
+    organization: str
+    dates: str
+    description: list[str]
+
+
+class OtherSection(TypedDict, total=False):
+    section_title: str
+    type: str
+    entries: list[SectionEntry]
+    items: list[str]
+
+
+class ResumeSchema(TypedDict, total=False):
+    name: str
+    email: str
+    phone: str
+    location: str
+    linkedin: str
+    website: str
+    github: str
+    contact_details: list[str]
+    experience: list[ExperienceEntry]
+    education: list[EducationEntry]
+    other_sections: list[OtherSection]
+    # No leading underscore: the SDK builds the schema through pydantic,
+    # which drops underscore-prefixed keys as private
+    parse_warnings: list[str]
+    version: str
+
+
+# Single-character fixes, applied in one str.translate pass
+_CLEAN_TRANS = str.maketrans({
+    '–': '-',  # en-dash
+    '—': '-',  # em-dash
+    '“': '"', '”': '"',  # smart quotes
+    '‘': "'", '’': "'",  # smart apostrophes
+    '…': '...',  # ellipsis
+    # Normalize subscripts/superscripts (not supported by xhtml2pdf)
+    **dict(zip('₀₁₂₃₄₅₆₇₈₉', '0123456789')),
+    **dict(zip('⁰¹²³⁴⁵⁶⁷⁸⁹', '0123456789')),
+})
+
+# UTF-8 punctuation that was mis-decoded as cp1252
+_CORRUPT_MAP = {
+    'â€“': '-',  # corrupted en-dash
+    'â€”': '-',  # corrupted em-dash
+    'â€œ': '"',  # corrupted opening quote
+    'â€™': "'", 'â€˜': "'",  # corrupted apostrophes
+    'â€¢': '•',  # corrupted bullet
+    'â€¦': '...',  # corrupted ellipsis
+    'â€': '"',  # corrupted closing quote (last byte is lost)
+}
+# Longest sequences first so the bare prefix only matches as a fallback
+_CORRUPT_RE = re.compile("|".join(
+    re.escape(seq) for seq in sorted(_CORRUPT_MAP, key=len, reverse=True)
+))
+
+
+def clean_encoding(text):
+    """Fix encoding artifacts in extracted text before it is sent to the LLM."""
+    if isinstance(text, str):
+        # Mojibake first: the corrupted sequences contain characters the table would rewrite
+        text = _CORRUPT_RE.sub(lambda match: _CORRUPT_MAP[match.group(0)], text)
+        text = text.translate(_CLEAN_TRANS)
+    return text
+
+
+# Leading dashes/bullets the LLM sometimes leaves on list items
+_BULLET_CHARS = '- •·∙→▪'
+
+
+def clean_parsed_strings(data):
+    """Strip whitespace and leading bullets from every string in parsed JSON.
+
+    Containers are walked with an explicit stack and updated in place.
+    """
+    if isinstance(data, str):
+        return data.strip().lstrip(_BULLET_CHARS).strip()
+
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            items = obj.items()
+        elif isinstance(obj, list):
+            items = enumerate(obj)
+        else:
+            continue
+        for key, value in items:
+            if isinstance(value, str):
+                obj[key] = value.strip().lstrip(_BULLET_CHARS).strip()
+            elif isinstance(value, (dict, list)):
+                stack.append(value)
+    return data
+
+
+def parse_cache_key(cleaned_text):
+    """Content address of a parse: cleaned resume text, prompt version and model."""
+    payload = "\0".join((cleaned_text, PROMPT_VERSION, GEMINI_MODEL))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=32)
+def load_cached_parse(digest):
+    """Read a cached parse from disk. Misses raise, so only hits are memoized."""
+    return orjson.loads((PARSE_CACHE_DIR / f"{digest}.json").read_bytes())
+
+
+def store_cached_parse(digest, parsed_data):
+    """Atomically write a parse result to the disk cache (best effort)."""
+    tmp_file = None
+    try:
+        PARSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=PARSE_CACHE_DIR, suffix=".tmp", delete=False) as tmp_file:
+            tmp_file.write(orjson.dumps(parsed_data))
+        os.replace(tmp_file.name, PARSE_CACHE_DIR / f"{digest}.json")
+    except OSError:
+        if tmp_file is not None:
+            _remove_file(tmp_file.name)
+        return
+    # A forced re-parse replaces an entry that may already be memoized
+    load_cached_parse.cache_clear()
+
+
+def cached_parse(func):
+    """Skip the Gemini round-trip for resume text that has already been parsed.
+
+    The text is cleaned once here; the wrapped function receives the cleaned text.
+    """
+    @wraps(func)
+    def wrapper(text, api_key, force_refresh=False):
+        text = clean_encoding(text)
+        digest = parse_cache_key(text)
+        if not force_refresh:
+            try:
+                parsed_data = fast_clone(load_cached_parse(digest))
+            except (OSError, ValueError):
+                pass
+            else:
+                st.caption("⚡ Loaded a cached parse of this resume. Tick \"Force re-parse\" in the sidebar to call Gemini again.")
+                return parsed_data
+
+        parsed_data = func(text, api_key)
+        if parsed_data is not None:
+            store_cached_parse(digest, parsed_data)
+        return parsed_data
+
+    return wrapper
+
+
+@cached_parse
+def parse_resume_with_gemini(text, api_key):
+    """Parse resume text using Gemini LLM to extract structured data without summarizing.
+
+    Encoding issues are cleaned by the cached_parse wrapper before the text gets here.
+    """
+    
+    # Configure Gemini
+    genai.configure(api_key=api_key)
+    
+    prompt = PROMPT_TEMPLATE.substitute(resume_text=text)
+    
+    try:
+        with st.spinner("🧠 Parsing resume with Gemini AI..."):
+            model = genai.GenerativeModel(GEMINI_MODEL, system_instruction=SYSTEM_PROMPT)
+            generation_config = genai.types.GenerationConfig(
+                temperature=0,  # Deterministic output for consistency
+                # Schema-constrained JSON: no markdown fences or chatter to strip
+                response_mime_type="application/json",
+                response_schema=ResumeSchema,
+            )
+            response = model.generate_content(
+                prompt, 
+                generation_config=generation_config,
+                request_options={"timeout": 120}
+            )
+            
+            response_text = response.text.strip()
+            
+            # Parse JSON
+            parsed_data = orjson.loads(response_text)
+            
+            # Simple cleanup of any remaining artifacts
+            parsed_data = clean_parsed_strings(parsed_data)
+            
+            # Log the parsed data for debugging
+            with st.expander("🔍 View Extracted Data (Debug)", expanded=False):
+                st.json(parsed_data)
+            
+            return parsed_data
+            
+    except orjson.JSONDecodeError as e:
+        st.error(f"❌ Failed to parse JSON response from Gemini")
+        with st.expander("📋 Error Details", expanded=True):
+            st.error(f"JSON Error: {e}")
+            st.code(response_text, language="text")
+        return None
+        
+    except Exception as e:
+        st.error(f"❌ Error calling Gemini API: {e}")
+        with st.expander("📋 Error Details", expanded=True):
+            st.exception(e)
+        return None
+
+
+# --- PDF Generation ---
+# Anything but letters, digits, spaces and underscores (\w is exactly
+# str.isalnum() plus underscore), stripped from download file names
+_UNSAFE_FILENAME_RE = re.compile(r"[^\w ]")
+
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_template():
+    """Load the HTML template and logo URI once per process."""
+    # Get the directory where this script is located
+    template_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    # Load template
+    env = Environment(loader=FileSystemLoader(template_dir), autoescape=True)
+    template = env.get_template("templatev2.html")
+    
+    # Absolute logo path for the rendered HTML
+    logo_file = Path(template_dir, 'ml-logo (1).png')
+    logo_uri = logo_file.resolve().as_uri() if logo_file.exists() else ''
+    
+    return template, template_dir, logo_uri
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_file_dir():
+    """Create the process-wide directory that holds PDFs kept between reruns."""
+    session_file_dir = tempfile.mkdtemp(prefix="ml-resume-formatter-")
+    atexit.register(shutil.rmtree, session_file_dir, True)
+    return session_file_dir
+
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class SessionFile:
+    """Bytes spilled to disk and deleted as soon as nothing references them.
+
+    Stored in st.session_state, so the file goes away when the value is
+    replaced, the state is cleared or the session itself ends.
+    """
+
+    def __init__(self, data, suffix):
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=get_session_file_dir()) as tmp:
+            tmp.write(data)
+        self.path = tmp.name
+        weakref.finalize(self, _remove_file, self.path)
+
+    def read_bytes(self):
+        return Path(self.path).read_bytes()
+
+
+def generate_pdf(data, output_path):
+    """Generate formatted PDF from parsed data using HTML template."""
+    try:
+        with st.spinner("📄 Generating formatted PDF..."):
+            template, template_dir, logo_uri = get_pdf_template()
+            # Wraps Pango/fontconfig state, which is not thread-safe, so it
+            # is not shared between sessions
+            font_config = FontConfiguration()
+            
+            # Render HTML with absolute logo path
+            data_with_logo = {**data, 'logo_path': logo_uri}
+            html_content = template.render(data_with_logo)
+            
+            # Generate PDF using WeasyPrint (better CSS support)
+            html = HTML(string=html_content, base_url=template_dir)
+            html.write_pdf(target=output_path, font_config=font_config)
+            
+            return True
+            
+    except Exception as e:
+        st.error(f"❌ Error generating PDF: {e}")
+        with st.expander("📋 Error Details", expanded=True):
+            st.exception(e)
+        return False
+
+
+def convert_docx_to_pdf_bytes(docx_path):
+    """Convert a DOCX file to PDF and return the PDF bytes.
+
+    Meant to run on a worker thread, so failures are raised to the caller
+    instead of being reported through Streamlit.
+    """
+    if sys.platform == "win32":
+        # docx2pdf drives Word over COM, which has to be initialised per thread
+        import pythoncom
+        pythoncom.CoInitialize()
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=PDF_TEMP_DIR) as tmp_pdf:
+            pdf_path = tmp_pdf.name
+        try:
+            convert(docx_path, pdf_path)
+            return Path(pdf_path).read_bytes()
+        finally:
+            try:
+                os.unlink(pdf_path)
+            except OSError:
+                pass
+    finally:
+        if sys.platform == "win32":
+            pythoncom.CoUninitialize()
+
+
+def merge_pdfs(main_pdf_path, candidate_sheet_path):
+    """Merge two PDFs - append candidate sheet to the end of main resume.
+
+    Returns the merged PDF bytes, or None if the merge failed.
+    """
+    try:
+        with pymupdf.open(main_pdf_path) as merged_pdf, pymupdf.open(candidate_sheet_path) as candidate_pdf:
+            # Append all pages from candidate sheet
+            merged_pdf.insert_pdf(candidate_pdf)
+            
+            # Serialize in memory, dropping unused objects and recompressing streams
+            return merged_pdf.tobytes(garbage=3, deflate=True)
+    except Exception as e:
+        st.error(f"❌ Error merging PDFs: {e}")
+        with st.expander("📋 Error Details", expanded=True):
+            st.exception(e)
+        return None
+
+
+# --- Editor Widgets ---
+def _experience_inputs(idx, job):
+    """Raw editor values for an experience entry.
+
+    Read from the widget keys, falling back to the saved values for any
+    widget that has not been rendered yet.
+    """
+    state = st.session_state
+    return {
+        "title": state.get(f"exp_title_{idx}", job.get("title", "")),
+        "company": state.get(f"exp_company_{idx}", job.get("company", "")),
+        "dates": state.get(f"exp_dates_{idx}", job.get("dates", "")),
+        "description_text": state.get(f"exp_description_{idx}", job.get("description") or []),
+        "remove": state.get(f"exp_remove_{idx}", False),
+    }
+
+
+def _education_inputs(idx, edu):
+    """Raw editor values for an education entry, falling back to the saved ones."""
+    state = st.session_state
+    return {
+        "degree": state.get(f"edu_degree_{idx}", edu.get("degree", "")),
+        "institution": state.get(f"edu_institution_{idx}", edu.get("institution", "")),
+        "dates": state.get(f"edu_dates_{idx}", edu.get("dates", "")),
+        "details_text": state.get(f"edu_details_{idx}", edu.get("details") or []),
+        "remove": state.get(f"edu_remove_{idx}", False),
+    }
+
+
+def _section_inputs(sec_idx, section):
+    """Raw editor values for an additional section, falling back to the saved ones."""
+    state = st.session_state
+    saved_type = "structured" if section.get("type", "structured") == "structured" else "list"
+    section_type = state.get(f"section_type_{sec_idx}", saved_type)
+    entries_input = []
+    items_input = ""
+    if section_type == "structured":
+        entries_input = [
+            {
+                "title": state.get(f"section_{sec_idx}_entry_title_{entry_idx}", entry.get("title", "")),
+                "organization": state.get(f"section_{sec_idx}_entry_org_{entry_idx}", entry.get("organization", "")),
+                "dates": state.get(f"section_{sec_idx}_entry_dates_{entry_idx}", entry.get("dates", "")),
+                "description_text": state.get(f"section_{sec_idx}_entry_desc_{entry_idx}", entry.get("description") or []),
+                "remove": state.get(f"section_{sec_idx}_entry_remove_{entry_idx}", False),
+            }
+            for entry_idx, entry in enumerate(section.get("entries") or [])
+        ]
+    else:
+        items_input = state.get(f"section_{sec_idx}_items", section.get("items") or [])
+    return {
+        "section_title": state.get(f"section_title_{sec_idx}", section.get("section_title", "")),
+        "section_type": section_type,
+        "remove": state.get(f"section_remove_{sec_idx}", False),
+        "entries_input": entries_input,
+        "items_input": items_input,
+    }
+
+
+def collect_editor_inputs(resume_data, resume_view):
+    """Gather the submitted editor values for build_updated_resume."""
+    state = st.session_state
+    raw_inputs = {
+        key: state.get(widget_key, resume_data.get(key) or "")
+        for key, widget_key in (
+            ("name", "editor_name"),
+            ("version", "editor_version"),
+            ("email", "contact_email"),
+            ("phone", "contact_phone"),
+            ("mobile", "contact_mobile"),
+            ("location", "contact_location"),
+            ("linkedin", "contact_linkedin"),
+            ("website", "contact_website"),
+            ("github", "contact_github"),
+        )
+    }
+    raw_inputs["contact_details"] = state.get("contact_details", resume_view.contact_details)
+    raw_inputs["experience"] = [_experience_inputs(idx, job) for idx, job in enumerate(resume_view.experience)]
+    raw_inputs["education"] = [_education_inputs(idx, edu) for idx, edu in enumerate(resume_view.education)]
+    raw_inputs["other_sections"] = [
+        _section_inputs(sec_idx, section) for sec_idx, section in enumerate(resume_view.other_sections)
+    ]
+    return raw_inputs
+
+
+def _edit_experience(idx, job):
+    """Render the editor for one experience entry; collect_editor_inputs reads the values back."""
+    label = job.get("title") or job.get("company") or f"Experience #{idx + 1}"
+    with st.expander(f"Experience #{idx + 1}: {label}", expanded=False):
+        st.text_input(
+            "Title",
+            value=job.get("title", ""),
+            key=f"exp_title_{idx}"
+        )
+        st.text_input(
+            "Company",
+            value=job.get("company", ""),
+            key=f"exp_company_{idx}"
+        )
+        st.text_input(
+            "Dates",
+            value=job.get("dates", ""),
+            key=f"exp_dates_{idx}"
+        )
+        seed_multiline_widget(f"exp_description_{idx}", job.get("description", []))
+        st.text_area(
+            "Description (one bullet per line)",
+            key=f"exp_description_{idx}",
+            height=140
+        )
+        st.checkbox(
+            "Remove this experience",
+            value=False,
+            key=f"exp_remove_{idx}"
+        )
+
+
+def _edit_education(idx, edu):
+    """Render the editor for one education entry; collect_editor_inputs reads the values back."""
+    label = edu.get("degree") or edu.get("institution") or f"Education #{idx + 1}"
+    with st.expander(f"Education #{idx + 1}: {label}", expanded=False):
+        st.text_input(
+            "Degree",
+            value=edu.get("degree", ""),
+            key=f"edu_degree_{idx}"
+        )
+        st.text_input(
+            "Institution",
+            value=edu.get("institution", ""),
+            key=f"edu_institution_{idx}"
+        )
+        st.text_input(
+            "Dates",
+            value=edu.get("dates", ""),
+            key=f"edu_dates_{idx}"
+        )
+        seed_multiline_widget(f"edu_details_{idx}", edu.get("details", []))
+        st.text_area(
+            "Details (one per line)",
+            key=f"edu_details_{idx}",
+            height=120
+        )
+        st.checkbox(
+            "Remove this education entry",
+            value=False,
+            key=f"edu_remove_{idx}"
+        )
+
+
+def _edit_other_section(sec_idx, section):
+    """Render the editor for one additional section; collect_editor_inputs reads the values back."""
+    with st.expander(f"Additional Section #{sec_idx + 1}: {section.get('section_title') or 'Untitled'}", expanded=False):
+        st.text_input(
+            "Section title",
+            value=section.get("section_title", ""),
+            key=f"section_title_{sec_idx}"
+        )
+        section_type_value = st.selectbox(
+            "Section type",
+            options=["structured", "list"],
+            index=0 if section.get("type", "structured") == "structured" else 1,
+            key=f"section_type_{sec_idx}"
+        )
+        st.checkbox(
+            "Remove this section",
+            value=False,
+            key=f"section_remove_{sec_idx}"
+        )
+
+        if section_type_value == "structured":
+            for entry_idx, entry in enumerate(section.get("entries", []) or []):
+                st.markdown(f"**Entry {entry_idx + 1}**")
+                st.text_input(
+                    "Title",
+                    value=entry.get("title", ""),
+                    key=f"section_{sec_idx}_entry_title_{entry_idx}"
+                )
+                st.text_input(
+                    "Organization",
+                    value=entry.get("organization", ""),
+                    key=f"section_{sec_idx}_entry_org_{entry_idx}"
+                )
+                st.text_input(
+                    "Dates",
+                    value=entry.get("dates", ""),
+                    key=f"section_{sec_idx}_entry_dates_{entry_idx}"
+                )
+                seed_multiline_widget(f"section_{sec_idx}_entry_desc_{entry_idx}", entry.get("description", []))
+                st.text_area(
+                    "Description (one per line)",
+                    key=f"section_{sec_idx}_entry_desc_{entry_idx}",
+                    height=120
+                )
+                st.checkbox(
+                    "Remove this entry",
+                    value=False,
+                    key=f"section_{sec_idx}_entry_remove_{entry_idx}"
+                )
+        else:
+            seed_multiline_widget(f"section_{sec_idx}_items", section.get("items", []))
+            st.text_area(
+                "Items (one per line)",
+                key=f"section_{sec_idx}_items",
+                height=120
+            )
+
+
+# --- Main Application ---
+def main():
+    st.title("📄 Resume Formatter")
+    st.markdown("""
+    Transform your resume into a standardised, professional format.
+    
+    **How it works:**
+    1. Upload your resume (PDF or DOCX)
+    2. AI extracts and preserves your content
+    3. Download your beautifully formatted resume
+    """)
+    
+    st.session_state.setdefault("parsed_resume", None)
+    st.session_state.setdefault("edited_resume", None)
+    st.session_state.setdefault("parse_warnings", [])
+    st.session_state.setdefault("generated_pdf", None)
+    st.session_state.setdefault("validation_errors", [])
+    st.session_state.setdefault("validation_warnings", [])
+    st.session_state.setdefault("uploaded_file_signature", None)
+    st.session_state.setdefault("candidate_sheet", None)
+    st.session_state.setdefault("candidate_sheet_signature", None)
+    st.session_state.setdefault("candidate_sheet_pdf", None)
+
+    # Get API key
+    api_key = get_api_key()
+    
+    if not api_key:
+        st.warning("⚠️ Please enter your Google Gemini API key to continue.")
+        st.info("Get your API key from: https://makersuite.google.com/app/apikey")
+        st.stop()
+
+    with st.sidebar:
+        force_reparse = st.checkbox(
+            "Force re-parse",
+            value=False,
+            help="Ignore the cached result for this resume and send it to Gemini again."
+        )
+    
+    # File uploaders
+    st.divider()
+    uploaded_file = st.file_uploader(
+        "Upload your resume",
+        type=['pdf', 'docx'],
+        help="Supported formats: PDF, DOCX"
+    )
+    
+    candidate_sheet_file = st.file_uploader(
+        "Upload Candidate Sheet (optional)",
+        type=['pdf', 'docx'],
+        help="Optional: Add an additional document to append after your resume"
+    )
+
+    if uploaded_file is not None:
+        file_signature = f"{uploaded_file.name}:{getattr(uploaded_file, 'size', None)}"
+        previous_signature = st.session_state.get("uploaded_file_signature")
+        if file_signature != previous_signature:
+            clear_resume_processing_state()
+            st.session_state["uploaded_file_signature"] = file_signature
+    else:
+        if st.session_state.get("uploaded_file_signature") is not None:
+            clear_resume_processing_state()
+            st.session_state["uploaded_file_signature"] = None
+    
+    # Handle candidate sheet file state
+    if candidate_sheet_file is not None:
+        candidate_signature = f"{candidate_sheet_file.name}:{getattr(candidate_sheet_file, 'size', None)}"
+        previous_candidate_signature = st.session_state.get("candidate_sheet_signature")
+        if candidate_signature != previous_candidate_signature:
+            st.session_state["candidate_sheet"] = candidate_sheet_file
+            st.session_state["candidate_sheet_signature"] = candidate_signature
+            st.session_state["candidate_sheet_pdf"] = None
+            # Clear generated PDF so user needs to regenerate with new candidate sheet
+            st.session_state["generated_pdf"] = None
+    else:
+        if st.session_state.get("candidate_sheet_signature") is not None:
+            st.session_state["candidate_sheet"] = None
+            st.session_state["candidate_sheet_signature"] = None
+            st.session_state["candidate_sheet_pdf"] = None
+            st.session_state["generated_pdf"] = None
+    
+    if uploaded_file is not None:
+        # Display file info
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.success(f"✅ File uploaded: {uploaded_file.name}")
+            if candidate_sheet_file is not None:
+                st.info(f"📎 Candidate sheet: {candidate_sheet_file.name}")
+        with col2:
+            process_button = st.button("🚀 Process Resume", type="primary", use_container_width=True)
+        
+        if process_button:
+            # Content hash of the upload (zero-copy view of its buffer) keys the extraction cache
+            resume_digest = hashlib.blake2b(uploaded_file.getbuffer()).hexdigest()
+            resume_suffix = os.path.splitext(uploaded_file.name)[1]
+
+            # A DOCX candidate sheet is converted while Gemini parses the resume;
+            # the two wait on different resources (local converter vs. remote API)
+            candidate_docx_path = None
+            candidate_future = None
+            pool = ThreadPoolExecutor(max_workers=1)
+            if candidate_sheet_file is not None and os.path.splitext(candidate_sheet_file.name)[1].lower() == '.docx':
+                candidate_docx_path = save_upload_to_tempfile(candidate_sheet_file, '.docx')
+                candidate_future = pool.submit(convert_docx_to_pdf_bytes, candidate_docx_path)
+            
+            try:
+                # Step 1: Extract text
+                with st.status("Processing resume...", expanded=True) as status:
+                    st.write("📄 Extracting text from resume...")
+                    raw_text = extract_text_cached(resume_digest, resume_suffix, uploaded_file)
+                    
+                    if not raw_text:
+                        st.error("Failed to extract text from resume.")
+                        status.update(label="❌ Processing failed", state="error")
+                        return
+                    
+                    st.write("✅ Text extracted successfully")
+                    
+                    # Show extracted raw text for debugging
+                    with st.expander("📝 View Extracted Text (What the LLM sees)", expanded=False):
+                        st.text_area("Raw Text from PDF/DOCX:", raw_text, height=300)
+                    
+                    # Step 2: Parse with Gemini
+                    st.write("🧠 Parsing resume structure...")
+                    parsed_data = parse_resume_with_gemini(raw_text, api_key, force_refresh=force_reparse)
+                    
+                    if not parsed_data:
+                        st.error("Failed to parse resume data.")
+                        status.update(label="❌ Processing failed", state="error")
+                        return
+                    
+                    st.write("✅ Resume parsed successfully")
+                    parsed_snapshot = fast_clone(parsed_data) if isinstance(parsed_data, dict) else parsed_data
+                    model_warnings = []
+                    if isinstance(parsed_snapshot, dict):
+                        model_warnings = parsed_snapshot.pop("parse_warnings", [])
+                    st.session_state["parse_warnings"] = model_warnings
+                    reset_editor_widget_state()
+                    if isinstance(parsed_snapshot, dict):
+                        st.session_state["parsed_resume"] = fast_clone(parsed_snapshot)
+                        st.session_state["edited_resume"] = fast_clone(parsed_snapshot)
+                        errors, warnings = validate_resume_cached(orjson.dumps(parsed_snapshot, option=orjson.OPT_SORT_KEYS))
+                        st.session_state["validation_errors"] = errors
+                        st.session_state["validation_warnings"] = warnings
+                    else:
+                        st.session_state["parsed_resume"] = parsed_snapshot
+                        st.session_state["edited_resume"] = parsed_snapshot
+                        st.session_state["validation_errors"] = []
+                        st.session_state["validation_warnings"] = []
+                    st.session_state["generated_pdf"] = None
+                    st.session_state["uploaded_filename"] = uploaded_file.name
+                    if candidate_future is not None:
+                        try:
+                            st.session_state["candidate_sheet_pdf"] = SessionFile(candidate_future.result(), '.pdf')
+                        except Exception:
+                            # Retried (and reported) when the PDF is generated
+                            st.session_state["candidate_sheet_pdf"] = None
+                    st.success("Review the parsed data below before generating the PDF.")
+                    status.update(label="✅ Parsing complete — review the details below", state="complete")
+                
+            finally:
+                pool.shutdown(wait=True)
+                # Cleanup temporary candidate sheet
+                if candidate_docx_path:
+                    try:
+                        os.unlink(candidate_docx_path)
+                    except:
+                        pass
+    
+    edited_resume_data = st.session_state.get("edited_resume")
+
+    if edited_resume_data is not None:
+        st.divider()
+        st.subheader("Step 3: Review & edit details")
+
+        if not isinstance(edited_resume_data, dict):
+            st.warning("Parsed data is not in the expected object format. Please inspect the raw output in the debug panel.")
+        else:
+            resume_view = ResumeView.from_dict(edited_resume_data)
+
+            warnings = st.session_state.get("parse_warnings", [])
+            if warnings:
+                st.warning("Gemini flagged the following items for review:\n" + "\n".join(f"- {warning}" for warning in warnings))
+
+            st.caption("Adjust any fields below. Leave an entry blank to remove it when you save.")
+
+            add_cols = st.columns(2)
+            with add_cols[0]:
+                if st.button("➕ Add experience entry"):
+                    # Only the top-level list changes, so nested entries can be shared
+                    current = {
+                        **edited_resume_data,
+                        "experience": [*resume_view.experience, blank_experience()],
+                    }
+                    st.session_state["edited_resume"] = current
+                    st.rerun()
+            with add_cols[1]:
+                if st.button("➕ Add education entry"):
+                    current = {
+                        **edited_resume_data,
+                        "education": [*resume_view.education, blank_education()],
+                    }
+                    st.session_state["edited_resume"] = current
+                    st.rerun()
+
+            for sec_idx, section in enumerate(resume_view.other_sections):
+                if section.get("type", "structured") != "structured":
+                    continue
+                section_label = section.get("section_title") or f"Additional Section #{sec_idx + 1}"
+                if st.button(f"➕ Add entry to {section_label}", key=f"add_structured_entry_{sec_idx}"):
+                    other_sections = list(resume_view.other_sections)
+                    other_sections[sec_idx] = {
+                        **section,
+                        "entries": [*(section.get("entries") or []), blank_structured_entry()],
+                    }
+                    current = {**edited_resume_data, "other_sections": other_sections}
+                    st.session_state["edited_resume"] = current
+                    st.rerun()
+
+            st.caption("Edits are applied when you save, so save before adding new entries.")
+
+            with st.form("resume_editor", border=False):
+                st.text_input(
+                    "Candidate name",
+                    value=edited_resume_data.get("name", ""),
+                    key="editor_name"
+                )
+
+                st.text_input(
+                    "Schema version",
+                    value=edited_resume_data.get("version", ""),
+                    key="editor_version"
+                )
+
+                contact_cols = st.columns(2)
+                with contact_cols[0]:
+                    st.text_input(
+                        "Email",
+                        value=edited_resume_data.get("email", ""),
+                        key="contact_email"
+                    )
+                    st.text_input(
+                        "Phone",
+                        value=edited_resume_data.get("phone", ""),
+                        key="contact_phone"
+                    )
+                st.text_input(
+                    "Alternate phone",
+                    value=edited_resume_data.get("mobile", ""),
+                    key="contact_mobile"
+                )
+                with contact_cols[1]:
+                    st.text_input(
+                        "Location",
+                        value=edited_resume_data.get("location", ""),
+                        key="contact_location"
+                    )
+                    st.text_input(
+                        "LinkedIn URL",
+                        value=edited_resume_data.get("linkedin", ""),
+                        key="contact_linkedin"
+                    )
+                    st.text_input(
+                        "Website / Portfolio",
+                        value=edited_resume_data.get("website", ""),
+                        key="contact_website"
+                    )
+
+                st.text_input(
+                    "GitHub",
+                    value=edited_resume_data.get("github", ""),
+                    key="contact_github"
+                )
+
+                seed_multiline_widget("contact_details", resume_view.contact_details)
+                st.text_area(
+                    "Additional Information (one per line)",
+                    key="contact_details",
+                    height=80,
+                    help="Add custom contact details or other information to appear in the header (e.g., nationality, citizenship, portfolio links)"
+                )
+
+                for idx, job in enumerate(resume_view.experience):
+                    _edit_experience(idx, job)
+
+                for idx, edu in enumerate(resume_view.education):
+                    _edit_education(idx, edu)
+
+                for sec_idx, section in enumerate(resume_view.other_sections):
+                    _edit_other_section(sec_idx, section)
+
+                action_cols = st.columns(2)
+                with action_cols[0]:
+                    save_clicked = st.form_submit_button("💾 Save edits")
+                with action_cols[1]:
+                    generate_clicked = st.form_submit_button(
+                        "✅ Confirm & Generate PDF",
+                        type="primary",
+                        key="generate_pdf_button",
+                        disabled=bool(st.session_state.get("validation_errors")),
+                    )
+
+            # Sanitizing and validating only happen on submit; other reruns
+            # show the results stored from the last save. Generating saves
+            # first and renders the PDF from the saved data on the rerun.
+            if save_clicked or generate_clicked:
+                raw_inputs = collect_editor_inputs(edited_resume_data, resume_view)
+                updated_resume = build_updated_resume(edited_resume_data, raw_inputs)
+                validation_errors, validation_warnings = validate_resume_cached(orjson.dumps(updated_resume, option=orjson.OPT_SORT_KEYS))
+                st.session_state["edited_resume"] = updated_resume
+                st.session_state["validation_errors"] = validation_errors
+                st.session_state["validation_warnings"] = validation_warnings
+                # Entries may have been dropped and indices shifted, so re-seed
+                # every editor widget from the saved data
+                reset_editor_widget_state()
+                if generate_clicked:
+                    st.session_state["generate_requested"] = True
+                else:
+                    st.session_state["edits_saved"] = True
+                st.rerun()
+
+            validation_errors = st.session_state.get("validation_errors", [])
+            validation_warnings = st.session_state.get("validation_warnings", [])
+
+            if validation_errors:
+                st.error("Please address the following before generating:\n" + "\n".join(f"- {issue}" for issue in validation_errors))
+
+            if validation_warnings:
+                st.warning("You can continue, but review these items:\n" + "\n".join(f"- {warning}" for warning in validation_warnings))
+
+            if not validation_errors and not validation_warnings:
+                st.success("All required sections look good. You can generate the PDF when ready.")
+            elif not validation_errors and validation_warnings:
+                st.info("No blocking issues detected. The warnings above are optional but recommended to address.")
+
+            if st.session_state.pop("edits_saved", False):
+                st.success("Edits saved to session.")
+
+            if st.session_state.pop("generate_requested", False) and not validation_errors:
+                output_path = None
+                candidate_temp_pdf = None
+                candidate_temp_docx = None
+                candidate_future = None
+                candidate_sheet = st.session_state.get("candidate_sheet")
+                pool = ThreadPoolExecutor(max_workers=1)
+                try:
+                    if (
+                        candidate_sheet is not None
+                        and os.path.splitext(candidate_sheet.name)[1].lower() == '.docx'
+                        and not st.session_state.get("candidate_sheet_pdf")
+                    ):
+                        # Not converted during parsing: convert it while the resume renders
+                        candidate_temp_docx = save_upload_to_tempfile(candidate_sheet, '.docx')
+                        candidate_future = pool.submit(convert_docx_to_pdf_bytes, candidate_temp_docx)
+
+                    # Generate main resume PDF
+                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=PDF_TEMP_DIR) as tmp_output:
+                        output_path = tmp_output.name
+                    
+                    if generate_pdf(edited_resume_data, output_path):
+                        # Check if there's a candidate sheet to append
+                        if candidate_sheet is not None:
+                            # Save candidate sheet to temporary file
+                            file_ext = os.path.splitext(candidate_sheet.name)[1].lower()
+
+                            if candidate_future is not None:
+                                with st.spinner("Converting candidate sheet to PDF..."):
+                                    try:
+                                        # Kept so later generations skip the conversion
+                                        st.session_state["candidate_sheet_pdf"] = SessionFile(candidate_future.result(), '.pdf')
+                                    except Exception as e:
+                                        st.error(f"❌ Error converting DOCX to PDF: {e}")
+                                        with st.expander("📋 Error Details", expanded=True):
+                                            st.exception(e)
+                                        st.warning("Failed to convert candidate sheet. Proceeding with resume only.")
+
+                            candidate_sheet_pdf = st.session_state.get("candidate_sheet_pdf")
+                            candidate_pdf_path = None
+
+                            if file_ext == '.docx' and candidate_sheet_pdf:
+                                # Already on disk; the session owns the file
+                                candidate_pdf_path = candidate_sheet_pdf.path
+
+                            elif file_ext == '.pdf':
+                                # Save PDF directly
+                                candidate_temp_pdf = save_upload_to_tempfile(candidate_sheet, '.pdf', dir=PDF_TEMP_DIR)
+                                candidate_pdf_path = candidate_temp_pdf
+                            
+                            # Merge PDFs if candidate sheet was successfully processed
+                            if candidate_pdf_path:
+                                with st.spinner("Merging resume with candidate sheet..."):
+                                    pdf_data = merge_pdfs(output_path, candidate_pdf_path)
+                                    if pdf_data is None:
+                                        st.warning("Failed to merge candidate sheet. Proceeding with resume only.")
+                                        pdf_data = Path(output_path).read_bytes()
+                            else:
+                                # No candidate sheet or conversion failed, use main resume only
+                                pdf_data = Path(output_path).read_bytes()
+                        else:
+                            # No candidate sheet, use main resume only
+                            pdf_data = Path(output_path).read_bytes()
+                        
+                        name_for_filename = edited_resume_data.get('name', 'Resume')
+                        safe_name = _UNSAFE_FILENAME_RE.sub("", name_for_filename).rstrip()
+                        if not safe_name:
+                            safe_name = 'Resume'
+                        pdf_filename = f"Formatted_{safe_name.replace(' ', '_')}.pdf"
+                        # Keep the bytes on disk until downloaded
+                        st.session_state["generated_pdf"] = {
+                            "file": SessionFile(pdf_data, '.pdf'),
+                            "filename": pdf_filename,
+                            # The JSON download exports exactly what was rendered
+                            "resume": edited_resume_data,
+                        }
+                        st.success("PDF generated successfully. Download it below.")
+                    else:
+                        st.error("Failed to generate PDF. Please review the data and try again.")
+                finally:
+                    # The worker may still be reading the DOCX
+                    pool.shutdown(wait=True)
+                    # Cleanup temporary files
+                    for temp_file in [output_path, candidate_temp_pdf, candidate_temp_docx]:
+                        if temp_file and os.path.exists(temp_file):
+                            try:
+                                os.unlink(temp_file)
+                            except OSError:
+                                pass
+
+            generated_pdf = st.session_state.get("generated_pdf")
+            if generated_pdf:
+                st.divider()
+                st.success("🎉 Your formatted resume is ready!")
+                download_cols = st.columns(2)
+                with download_cols[0]:
+                    st.download_button(
+                        label="⬇️ Download Formatted Resume",
+                        # Read from disk only when the button is clicked
+                        data=generated_pdf["file"].read_bytes,
+                        file_name=generated_pdf.get("filename", "Formatted_Resume.pdf"),
+                        mime="application/pdf",
+                        use_container_width=True
+                    )
+                with download_cols[1]:
+                    rendered_resume = generated_pdf.get("resume")
+                    if rendered_resume is not None:
+                        json_filename = generated_pdf.get("filename", "Formatted_Resume.pdf").replace('.pdf', '.json')
+                        st.download_button(
+                            label="⬇️ Download Edited JSON",
+                            # Serialized only when the button is clicked
+                            data=partial(to_pretty_json, rendered_resume),
+                            file_name=json_filename,
+                            mime="application/json",
+                            use_container_width=True
+                        )
+
+    # Footer
+    st.divider()
+    st.markdown("""
+    <div style='text-align: center; color: #666; padding: 20px;'>
+        <small>Powered by Google Gemini AI | Built with Streamlit</small>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+if __name__ == "__main__":
+    main()
+
+